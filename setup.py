@@ -9,8 +9,11 @@ python_requires = '>=3.7, <4'
 install_requires = [
 ]
 
-# Packages required for tests and docs
+# Packages required for optional features, tests and docs
 extras_require = {
+    'inotify': [
+        'inotify_simple~=2.0',
+    ],
     'test': [
         'setuptools',
         'editorconfig-checker~=3.2.0',
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+import base64
+import http.client
+import io
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+import pytest
+from transmission_watcher.transmission_watcher import (
+    CLEANUP_PERIOD, TransmissionWatcher, _format_size)
+
+
+def make_torrent(torrent_id, torrent_hash, name, done_date=None,
+                 percent_done=1.0, files=((100, 100),)):
+    """Create a torrent as reported by the `torrent-get` RPC method."""
+    return {
+        'id': torrent_id,
+        'hashString': torrent_hash,
+        'name': name,
+        'doneDate': int(time.time()) if done_date is None else done_date,
+        'percentDone': percent_done,
+        'haveValid': sum(completed for (completed, _) in files),
+        'files': [
+            {'bytesCompleted': completed, 'length': length,
+             'name': "{}/file{}".format(name, i)}
+            for i, (completed, length) in enumerate(files)
+        ],
+        'fileStats': [
+            {'bytesCompleted': completed, 'wanted': True, 'priority': 0}
+            for (completed, _) in files
+        ],
+    }
+
+
+@pytest.mark.parametrize("size_bytes, expected", [
+    (0, ("None", "")),
+    (512, ("512", "B")),
+    (1500, ("1.50", "kB")),
+    (150_500_000, ("150.5", "MB")),
+    (2_000_000_000_000_000, ("2000.0", "TB")),
+])
+def test_format_size(size_bytes, expected):
+    """Test that sizes are formatted like `transmission-remote` does."""
+    assert _format_size(size_bytes) == expected
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    """Create a watcher with a netrc credentials file."""
+    auth_file = tmp_path / "netrc"
+    auth_file.write_text("machine localhost login user password secret\n")
+    return TransmissionWatcher(str(tmp_path / "local"), str(tmp_path / "nas"),
+                               str(auth_file), str(tmp_path / "smb"),
+                               str(tmp_path / "watcher.log"))
+
+
+def test_log_handler(watcher, tmp_path):
+    """Test that only the log handler of the previous instance is replaced."""
+    package_logger = logging.getLogger("transmission_watcher")
+    app_handler = logging.NullHandler()
+    package_logger.addHandler(app_handler)
+    try:
+        log_file = tmp_path / "second.log"
+        second = TransmissionWatcher(str(tmp_path / "local"),
+                                     str(tmp_path / "nas"),
+                                     str(tmp_path / "netrc"),
+                                     str(tmp_path / "smb"), str(log_file))
+        second._logger.info("Only once")
+
+        assert app_handler in package_logger.handlers
+        assert [handler for handler in package_logger.handlers
+                if handler is not app_handler] == \
+            [TransmissionWatcher._log_handler]
+        assert log_file.read_text().count("Only once") == 1
+    finally:
+        package_logger.removeHandler(app_handler)
+
+
+def test_get_completed_torrents(watcher, monkeypatch):
+    """Test that only completed torrents with a finished date are reported."""
+    torrents = [
+        make_torrent(1, "aaa", "complete", files=((10, 10), (5, 20))),
+        make_torrent(2, "bbb", "downloading", percent_done=0.5,
+                     files=((10, 20),)),
+        make_torrent(3, "ccc", "no-done-date", done_date=0),
+    ]
+    monkeypatch.setattr(watcher, '_rpc',
+                        lambda method, arguments: {'torrents': torrents})
+
+    completed = watcher._get_completed_torrents()
+
+    assert list(completed) == ["aaa"]
+    assert completed["aaa"]['id'] == 1
+    assert completed["aaa"]['name'] == "complete"
+    assert completed["aaa"]['have_files'] == 1
+    assert completed["aaa"]['copied'] is False
+
+
+def test_get_completed_torrents_rpc_failure(watcher, monkeypatch):
+    """Test that a failed RPC request is reported as `None`."""
+    monkeypatch.setattr(watcher, '_rpc', lambda method, arguments: None)
+    assert watcher._get_completed_torrents() is None
+
+
+def test_rpc_session_id_retry(watcher, monkeypatch):
+    """Test that the request is repeated with the session ID upon HTTP 409."""
+    requests = []
+
+    def urlopen(request, timeout):
+        requests.append(request)
+        if request.get_header('X-transmission-session-id') != "session":
+            raise urllib.error.HTTPError(
+                request.full_url, 409, "Conflict",
+                {'X-Transmission-Session-Id': "session"}, None)
+        reply = {'result': 'success', 'arguments': {'torrents': []}}
+        return io.BytesIO(json.dumps(reply).encode())
+
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+
+    assert watcher._rpc('torrent-get', {'fields': ['id']}) == \
+        {'torrents': []}
+    assert len(requests) == 2
+    assert json.loads(requests[1].data) == \
+        {'method': 'torrent-get', 'arguments': {'fields': ['id']}}
+    assert requests[1].get_header('Authorization') == \
+        "Basic " + base64.b64encode(b"user:secret").decode()
+
+
+def test_rpc_failure(watcher, monkeypatch):
+    """Test that an unsuccessful RPC result is reported as `None`."""
+    def urlopen(request, timeout):
+        return io.BytesIO(json.dumps({'result': 'error'}).encode())
+
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    assert watcher._rpc('torrent-get') is None
+
+
+def test_rpc_incomplete_response(watcher, monkeypatch):
+    """Test that a truncated HTTP response is reported as `None`."""
+    def urlopen(request, timeout):
+        raise http.client.IncompleteRead(b"{\"result\"", 100)
+
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    assert watcher._rpc('torrent-get') is None
+
+
+@pytest.mark.parametrize("content", [
+    "machine localhost login alice password s3cret\n",
+    "alice:s3cret\n",
+])
+def test_read_transmission_auth(watcher, tmp_path, content):
+    """Test reading the credentials in netrc and `user:password` format."""
+    auth_file = tmp_path / "credentials"
+    auth_file.write_text(content)
+    watcher._transmission_auth_file = str(auth_file)
+
+    assert watcher._read_transmission_auth() == \
+        base64.b64encode(b"alice:s3cret").decode()
+
+
+def test_read_transmission_auth_unknown_host(watcher, tmp_path, caplog):
+    """Test that a netrc file without an entry for the host is reported."""
+    watcher._transmission_url = "http://127.0.0.1:9091/transmission/rpc"
+
+    with caplog.at_level(logging.WARNING):
+        assert watcher._read_transmission_auth() == ""
+    assert "'127.0.0.1'" in caplog.text
+
+
+def test_read_transmission_auth_missing_file(watcher, tmp_path):
+    """Test that a missing credentials file results in no credentials."""
+    watcher._transmission_auth_file = str(tmp_path / "missing")
+    assert watcher._read_transmission_auth() == ""
+
+
+class FakeDaemon:
+    """Stub of the RPC interface and the copy helpers of a watcher."""
+
+    def __init__(self, watcher, monkeypatch, torrents, copy_result=True):
+        self.torrents = torrents
+        self.copy_result = copy_result
+        self.copied = []
+        self.removed = []
+        monkeypatch.setattr(watcher, '_rpc', self.rpc)
+        monkeypatch.setattr(watcher, '_scan_local_dir', self.scan_local_dir)
+        monkeypatch.setattr(watcher, '_mount_nas', lambda: (True, False))
+        monkeypatch.setattr(watcher, '_rsync_torrents', self.rsync_torrents)
+        monkeypatch.setattr(watcher, '_rsync_torrent',
+                            lambda torrent, is_dir: self.copy_result)
+
+    def rpc(self, method, arguments=None):
+        if method == 'torrent-remove':
+            self.removed.append(arguments['ids'])
+            return {}
+        # Return new objects on every request, just like the daemon does
+        return {'torrents': json.loads(json.dumps(self.torrents))}
+
+    def scan_local_dir(self):
+        return {torrent['name']: False for torrent in self.torrents}
+
+    def rsync_torrents(self, torrents):
+        self.copied.append([torrent['name'] for torrent in torrents])
+        if self.copy_result:
+            for torrent in torrents:
+                torrent['copied'] = True
+        return self.copy_result
+
+
+def test_run_unchanged_and_copied_skips_copy(watcher, monkeypatch):
+    """Test that an unchanged, fully copied list is not copied again."""
+    daemon = FakeDaemon(watcher, monkeypatch,
+                        [make_torrent(1, "aaa", "first")])
+    watcher.run()
+    watcher.run()
+
+    assert daemon.copied == [["first"]]
+    assert watcher._database["aaa"]['copied'] is True
+
+
+def test_run_unchanged_with_uncopied_copies(watcher, monkeypatch):
+    """Test that an unchanged list is copied again until copying succeeds."""
+    daemon = FakeDaemon(watcher, monkeypatch,
+                        [make_torrent(1, "aaa", "first")], copy_result=False)
+    watcher.run()
+    daemon.copy_result = True
+    watcher.run()
+    watcher.run()
+
+    assert daemon.copied == [["first"], ["first"]]
+    assert watcher._database["aaa"]['copied'] is True
+
+
+def test_run_changed_file_count_resets_copied(watcher, monkeypatch):
+    """Test that a torrent is copied again if its file count changes."""
+    daemon = FakeDaemon(watcher, monkeypatch,
+                        [make_torrent(1, "aaa", "first", files=((1, 1),))])
+    watcher.run()
+    daemon.torrents = [make_torrent(1, "aaa", "first",
+                                    files=((1, 1), (1, 1)))]
+    daemon.copy_result = False
+    watcher.run()
+
+    assert daemon.copied == [["first"], ["first"]]
+    assert watcher._database["aaa"]['have_files'] == 2
+    assert watcher._database["aaa"]['copied'] is False
+
+
+def test_run_cleanup_period(watcher, monkeypatch):
+    """Test that old torrents are removed at most once per cleanup period."""
+    now = time.time()
+    clock = {'monotonic': 1000.0}
+    monkeypatch.setattr(time, 'time', lambda: now)
+    monkeypatch.setattr(time, 'monotonic', lambda: clock['monotonic'])
+    daemon = FakeDaemon(watcher, monkeypatch, [
+        make_torrent(1, "aaa", "old", done_date=int(now) - 31 * 86400),
+        make_torrent(2, "bbb", "new", done_date=int(now) - 29 * 86400),
+    ])
+
+    watcher.run()
+    assert daemon.removed == [[1]]
+
+    clock['monotonic'] += CLEANUP_PERIOD - 1
+    watcher.run()
+    assert daemon.removed == [[1]]
+
+    clock['monotonic'] += 1
+    watcher.run()
+    assert daemon.removed == [[1], [1]]
@@ -1,8 +1,14 @@
 #!/usr/bin/env python
 
 import argparse
+import logging
 import time
-from .transmission_watcher import TransmissionWatcher
+from .transmission_watcher import TransmissionWatcher, TRANSMISSION_RPC_URL
+
+try:
+    import inotify_simple
+except (ImportError, OSError):
+    inotify_simple = None
 
 LOCAL_DIR = "/mnt/exthd/Media"
 NAS_DIR = "/mnt/nas/Media"
@@ -10,6 +16,45 @@ TRANSMISSION_AUTH = "/home/pi/.transmission_credentials"
 NAS_SMB_AUTH = "/home/pi/.smb_credentials"
 LOG_FILE = "/home/pi/transmission_watcher.log"
 RUN_PERIOD = 5
+IDLE_PERIOD = 60
+EVENT_DELAY_MS = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _watch_local_dir(local_dir):
+    """Watch the local directory for new downloads with inotify.
+
+    The reason of falling back to polling (i.e. returning `None`) is logged.
+
+    :param local_dir: Path to the local directory to be watched.
+    :type local_dir: string
+    :return: The inotify instance watching the local directory; `None` if
+             inotify is not available (e.g. `inotify_simple` is not installed
+             or the directory does not support it).
+    :rtype: inotify_simple.INotify
+    """
+    if inotify_simple is None:
+        logger.info("inotify_simple is not installed; polling the local "
+                    "directory.")
+        return None
+
+    inotify = None
+    try:
+        inotify = inotify_simple.INotify()
+        inotify.add_watch(local_dir,
+                          inotify_simple.flags.MOVED_TO
+                          | inotify_simple.flags.CLOSE_WRITE
+                          | inotify_simple.flags.CREATE)
+    except OSError as error:
+        logger.warning("Cannot watch the local directory with inotify (%s); "
+                       "polling the local directory.", error)
+        if inotify is not None:
+            inotify.close()
+        return None
+
+    logger.info("Watching the local directory with inotify.")
+    return inotify
 
 
 def main():
@@ -29,10 +74,16 @@ def main():
         help="path to the remote directory where the downloaded content is "
              "stored")
 
+    parser.add_argument(
+        "--transmission-url",
+        default=TRANSMISSION_RPC_URL,
+        help="URL of the RPC interface of the Transmission daemon")
+
     parser.add_argument(
         "--transmission-auth",
         default=TRANSMISSION_AUTH,
-        help="path to the file that stores the Transmission credentials")
+        help="path to the file that stores the Transmission credentials "
+             "(netrc or 'user:password' format)")
 
     parser.add_argument(
         "--nas-auth",
@@ -47,16 +98,62 @@ def main():
     parser.add_argument(
         "--run-period",
         default=RUN_PERIOD,
-        help="execution period in seconds")
+        type=float,
+        help="execution period in seconds when polling; minimum time "
+             "between executions when watching with inotify")
+
+    parser.add_argument(
+        "--idle-period",
+        default=IDLE_PERIOD,
+        type=float,
+        help="maximum time in seconds between executions when the local "
+             "directory is watched with inotify")
+
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="always poll periodically instead of watching the local "
+             "directory with inotify")
 
     args = parser.parse_args()
 
     watcher = TransmissionWatcher(args.local_dir, args.nas_dir,
                                   args.transmission_auth, args.nas_auth,
-                                  args.log_file)
+                                  args.log_file,
+                                  transmission_url=args.transmission_url)
+
+    # Wake up when new content arrives in the local directory; events are
+    # collected for a short while so that a burst results in a single run.
+    # Changes that do not show up in the local directory (e.g. torrents
+    # removed from the daemon) are picked up after the idle period at latest.
+    # The runs are at least the run period apart, since events keep arriving
+    # while Transmission downloads into the local directory; the events
+    # arriving in the meantime are covered by the next run and are discarded.
+    inotify = None if args.poll else _watch_local_dir(args.local_dir)
+    if inotify is not None:
+        while True:
+            last_run = time.monotonic()
+            watcher.run()
+            inotify.read(timeout=int(args.idle_period * 1000),
+                         read_delay=EVENT_DELAY_MS)
+            sleep_time = last_run + args.run_period - time.monotonic()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+            inotify.read(timeout=0)
+
+    # Otherwise, schedule the runs against a monotonic deadline, so that the
+    # execution period does not drift by the duration of the runs. If a run
+    # takes longer than the period, the next run starts immediately and the
+    # schedule is realigned to the current time.
+    next_run = time.monotonic()
     while True:
         watcher.run()
-        time.sleep(args.run_period)
+        next_run += args.run_period
+        sleep_time = next_run - time.monotonic()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        else:
+            next_run = time.monotonic()
 
 
 if __name__ == "__main__":
@@ -1,17 +1,65 @@
 #!/usr/bin/env python
 
+import base64
 import datetime
+import http.client
+import json
 import logging
+import logging.handlers
+import netrc
 import os
 import subprocess
 import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+TRANSMISSION_RPC_URL = "http://localhost:9091/transmission/rpc"
+RPC_TIMEOUT = 30
+RPC_TORRENT_FIELDS = ["id", "hashString", "name", "doneDate", "percentDone",
+                      "haveValid", "files"]
+CLEANUP_PERIOD = 3600
+RSYNC_PARTIAL_DIR = ".rsync-partial"
+LOG_MAX_BYTES = 5_000_000
+LOG_BACKUP_COUNT = 3
+SIZE_UNITS = ["B", "kB", "MB", "GB", "TB"]
+
+
+def _format_size(size_bytes):
+    """Format a size in bytes the same way as `transmission-remote` does.
+
+    Bytes are shown without decimals, other units with two decimals below 100
+    and one decimal otherwise; a size of zero is shown as "None".
+
+    :param size_bytes: The size in bytes.
+    :type size_bytes: integer
+    :return: Tuple of the formatted size and its unit, e.g. ("1.50", "GB");
+             ("None", "") for zero.
+    :rtype: tuple (string, string)
+    """
+    if size_bytes == 0:
+        return ("None", "")
+    if size_bytes < 1000:
+        return ("{:d}".format(size_bytes), SIZE_UNITS[0])
+
+    size = float(size_bytes)
+    for unit in SIZE_UNITS[1:]:
+        size /= 1000
+        if size < 1000 or unit == SIZE_UNITS[-1]:
+            break
+    precision = 2 if size < 100 else 1
+    return ("{:.{}f}".format(size, precision), unit)
 
 
 class TransmissionWatcher:
 
+    # The log file handler created by the last constructed instance
+    _log_handler = None
+
     def __init__(self, local_dir, nas_dir,
                  transmission_auth_file, nas_smb_auth_file,
-                 log_file, logging_level=logging.INFO) -> None:
+                 log_file, logging_level=logging.INFO,
+                 transmission_url=TRANSMISSION_RPC_URL) -> None:
         """Constructor of the TransmissionWatcher object.
 
         :param local_dir:
@@ -28,33 +76,64 @@ class TransmissionWatcher:
         :param nas_smb_auth_file:
             Path to the file that stores the remote (NAS) SMB credentials.
         :type nas_smb_auth_file: string
-        :param log_file: Path to the log file.
+        :param log_file:
+            Path to the log file. The log file is rotated when it reaches
+            LOG_MAX_BYTES; LOG_BACKUP_COUNT rotated files are kept.
         :type log_file: string
         :param logging_level: The logging level, defaults to logging.INFO.
         :type logging_level: integer
+        :param transmission_url:
+            URL of the RPC interface of the Transmission daemon, defaults to
+            TRANSMISSION_RPC_URL.
+        :type transmission_url: string
         """
         self._local_dir = local_dir
         self._nas_dir = nas_dir
         self._transmission_auth_file = transmission_auth_file
         self._nas_smb_auth_file = nas_smb_auth_file
+        self._transmission_url = transmission_url
+        self._rpc_auth = None
+        self._rpc_session_id = None
         self._logger = logging.getLogger(__name__)
         self._database = None
-
-        logging.basicConfig(filename=log_file, level=logging_level,
-                            format='%(asctime)s [%(levelname)s] %(message)s')
+        self._last_fingerprint = None
+        self._last_cleanup_ts = None
+
+        # The log file is attached to the package logger, so that the other
+        # modules of the package (e.g. the CLI) log into the same file. Only
+        # the handler of a previous instance is replaced (so that the log
+        # messages are not duplicated if the watcher is constructed again);
+        # handlers configured by the application are left untouched.
+        package_logger = logging.getLogger(__package__)
+        if TransmissionWatcher._log_handler is not None:
+            package_logger.removeHandler(TransmissionWatcher._log_handler)
+            TransmissionWatcher._log_handler.close()
+        log_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+        log_handler.setFormatter(
+            logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+        log_handler.setLevel(logging_level)
+        package_logger.addHandler(log_handler)
+        TransmissionWatcher._log_handler = log_handler
+        if package_logger.getEffectiveLevel() > logging_level:
+            package_logger.setLevel(logging_level)
 
         self._logger.info("***")
         self._logger.info("Starting Transmission Watcher Service...")
 
+        # Read the credentials only once instead of upon every request
+        self._rpc_auth = self._read_transmission_auth()
+
     def run(self) -> None:
         """This watcher function ensures that completed torrents are copied to
         the NAS.
 
         The function checks the current state of the Transmission daemon and
         queries the completed torrents. The completed torrents with their
-        metadata are compiled into a list. The list is then processed and each
-        completed torrent that does not exist on the NAS is copied to the NAS.
-        After successful copy, the torrent is marked as 'copied' in the list.
+        metadata are compiled into a dictionary keyed by the torrent hash. The
+        dictionary is then processed and each completed torrent that does not
+        exist on the NAS is copied to the NAS. After successful copy, the
+        torrent is marked as 'copied' in the dictionary.
 
         Upon first run, the completed list becomes the torrent database as-is.
         During consecutive runs, the current completed list retrieved from the
@@ -64,11 +143,17 @@ class TransmissionWatcher:
         copied items are not copied over to the NAS to minimize network
         activity.
 
+        If the completed list has not changed since the previous run and all
+        torrents have already been copied, the database update and the copy
+        step are skipped altogether.
+
         Furthermore, completed torrents that are more than 30 days old
         (provided they already exist on the NAS) are deleted from the
-        transmission daemon and thus from the torrent database.
+        transmission daemon and thus from the torrent database. This check is
+        executed at most once per hour.
 
-        The method uses `rsync` for optimal copying. If the service is
+        The method uses `rsync` for optimal copying; all torrents marked for
+        copying are handled by a single `rsync` invocation. If the service is
         restarted (e.g. rebooting the system where this script runs), the
         torrent database needs to be created upon first execution, which means
         that all existing torrents are initially marked for copying, thus all
@@ -80,273 +165,397 @@ class TransmissionWatcher:
 
         .. note:: This function needs to be periodically called over time.
         """
-        # Get the actual completed torrent list from daemon
-        daemon_completed_list = self._get_completed_torrents()
-        if daemon_completed_list is None:
+        # Get the actual completed torrents from daemon
+        daemon_completed_map = self._get_completed_torrents()
+        if daemon_completed_map is None:
             self._logger.error("Cannot access transmission daemon.")
             return
 
+        # Fast path: if the completed list of the daemon has not changed since
+        # the last round and every torrent has already been copied, there is
+        # nothing to update or copy; only the cleanup check remains
+        fingerprint = hash(tuple(sorted(
+            (torrent_hash, daemon_item['have_files'])
+            for torrent_hash, daemon_item in daemon_completed_map.items())))
+        if (fingerprint == self._last_fingerprint
+                and self._database is not None
+                and all(torrent['copied']
+                        for torrent in self._database.values())):
+            self._remove_old_torrents(daemon_completed_map)
+            return
+
         # If the database does not exist (i.e. upon first execution):
         # Create database based on the current list of completed torrents
         if self._database is None:
             self._logger.info("Database is created from completed list of "
                               "torrents of daemon.")
-            self._database = daemon_completed_list
+            self._database = dict(daemon_completed_map)
 
         # Delete all torrents from database that are not in the completed list
         # reported by the daemon; e.g. torrents that have been deleted from
         # the daemon. After this operation, the database will contain only the
         # items that are part of the daemon completed list.
-        self._database = [
-            db_item for db_item in self._database if db_item['hash'] in [
-                daemon_item['hash'] for daemon_item in daemon_completed_list]
-        ]
+        self._database = {
+            torrent_hash: db_item
+            for torrent_hash, db_item in self._database.items()
+            if torrent_hash in daemon_completed_map
+        }
 
         # Iterate through the completed list of daemon and compare the item
         # with the item in the database:
         # - If the item does not exist, add it to the database
         # - If the item exists: check the number of files downloaded and mark
         #   it for copying if needed and update its metadata in database
-        for daemon_item in daemon_completed_list:
-            if daemon_item['hash'] not in [db_item['hash']
-                                           for db_item in self._database]:
+        for torrent_hash, daemon_item in daemon_completed_map.items():
+            if torrent_hash not in self._database:
                 # If item does not exist: add it to the database
-                self._database.append(daemon_item)
-            else:
+                self._database[torrent_hash] = daemon_item
+            elif (self._database[torrent_hash]['have_files']
+                    != daemon_item['have_files']):
                 # If the item exists: check the number of files downloaded and
                 # mark it for copying by updating the database metadata (which
                 # includes resetting the flag; thus marked for copying)
-                index = 0
-                for i, db_item in enumerate(self._database):
-                    if daemon_item['hash'] == db_item['hash']:
-                        index = i
-                        break
-                if (self._database[index]['have_files']
-                        != daemon_item['have_files']):
-                    self._database[index] = daemon_item
-
-        # Check for torrents that are marked for copying to NAS
-        is_mounted_by_this_service = False
-        for torrent in self._database:
+                self._database[torrent_hash] = daemon_item
+
+        # Collect torrents that are marked for copying to NAS
+        pending = []
+        local_entries = None
+        for torrent in self._database.values():
             if torrent['copied'] is False:
-                # Sanity check: check if torrent file exists locally
-                torrent_path_local = os.path.join(self._local_dir,
-                                                  torrent['name'])
-                if not os.path.exists(torrent_path_local):
+                # Sanity check: check if torrent file exists locally; the local
+                # directory is only scanned once per round
+                if local_entries is None:
+                    local_entries = self._scan_local_dir()
+                if torrent['name'] not in local_entries:
                     # Probably transmission has not finished moving the torrent
                     # to the download-dir; simply ignore it until it's there.
                     # In case the torrent data has been deleted (e.g. from the
                     # web interface right after download has completed) just
                     # before arriving here; then simply ignore and continue
                     continue
-                # Mount NAS SMB share; simply break and retry next round if
-                # fails
-                (mount_result, is_mount_executed) = self._mount_nas()
-                if mount_result is False:
-                    break
-                if is_mount_executed is True:
-                    is_mounted_by_this_service = True
+                pending.append(torrent)
+
+        # Copy the pending torrents to NAS; the NAS is only touched if there
+        # is anything to copy, so idle rounds do not execute any subprocess
+        is_mounted_by_this_service = False
+        if pending:
+            # Mount NAS SMB share; simply skip copying and retry next round if
+            # fails
+            (mount_result, is_mount_executed) = self._mount_nas()
+            if is_mount_executed is True:
+                is_mounted_by_this_service = True
+            if mount_result is True:
                 # Note: simply perform an rsync, because it will skip already
                 # copied files. This brings two benefits: (1) upon service
                 # start, every existing torrents will be checked (since their
                 # flag is False), but all the identical ones will be ignored
-                # and (2) all files that are not matching (e.g. a previous copy
-                # had been interrupted) will be copied. Thus, rsync will
-                # effectively copy only the required files.
-                self._logger.info("Updating: %s", torrent['name'])
-                torrent_path_nas = os.path.join(self._nas_dir, torrent['name'])
-                time_copy_begin = time.time()
-                torrent_source = torrent_path_local + "/" if os.path.isdir(
-                    torrent_path_local) else torrent_path_local
-                result = subprocess.run(
-                    ["rsync", "-avhu", "--exclude=*.part",
-                        torrent_source, torrent_path_nas],
-                    capture_output=True, check=False, text=True)
-                if result.returncode != 0:
-                    self._logger.error("Failed to rsync torrent: %s",
-                                       torrent['name'])
-                else:
-                    time_copy_end = time.time()
-                    torrent['copied'] = True
-                    elapsed_s = round(time_copy_end - time_copy_begin)
-                    duration = str(datetime.timedelta(seconds=elapsed_s))
-                    self._logger.info(
-                        "Updating done. Size: %s %s, Duration: %s",
-                        torrent['have_size'], torrent['have_unit'], duration)
-
-        # Check for completed and copied torrents that are > 30 days old
-        for torrent in self._database:
-            if torrent['copied'] is True:
-                finished_date = datetime.datetime.strptime(
-                    torrent['date_finished'], "%a %b %d %H:%M:%S %Y")
-                finished_days = (datetime.datetime.now() - finished_date).days
-                if finished_days > 30:
-                    self._logger.info("Removing: %s", torrent['name'])
-                    torrent_id = self._get_torrent_id_based_on_hash(
-                        torrent['hash'])
-                    if torrent_id is not None:
-                        subprocess.run(
-                            ["transmission-remote",
-                             "-N", self._transmission_auth_file,
-                             "-t", torrent_id, "--remove-and-delete"],
-                            capture_output=True, check=False, text=True)
+                # and (2) all files that are not matching (e.g. a previous
+                # copy had been interrupted) will be copied. Thus, rsync will
+                # effectively copy only the required files. All pending
+                # torrents are copied with a single rsync; if it fails, every
+                # torrent is copied one by one to isolate the failing one.
+                if self._rsync_torrents(pending) is False:
+                    for torrent in pending:
+                        self._rsync_torrent(torrent,
+                                            local_entries[torrent['name']])
 
         # Unmount NAS SMB share only if it had been mounted by this service
         if is_mounted_by_this_service is True:
             self._unmount_nas()
 
-    def _get_torrent_info(self, torrent_id):
-        """Get information about a torrent from the daemon.
+        self._last_fingerprint = fingerprint
+        self._remove_old_torrents(daemon_completed_map)
+
+    def _remove_old_torrents(self, daemon_completed_map):
+        """Remove completed and copied torrents that are > 30 days old.
 
-        The function returns a tuple containing the name, hash, done percentage
-        and the finished date of the requested torrent based on its ID.
+        The check is executed at most once per `CLEANUP_PERIOD` seconds, since
+        the age of the torrents is measured in days.
 
-        :param torrent_id: The ID of the requested torrent.
-        :type torrent_id: integer
-        :return: Tuple of torrent name, hash, done percentage, date finished;
-                 None if torrent cannot be found (i.e. invalid torrent id
-                 supplied).
-        :rtype: tuple (string, string, integer, string)
+        :param daemon_completed_map:
+            The completed torrents reported by the daemon, keyed by the
+            torrent hash.
+        :type daemon_completed_map: dict
         """
-        result = subprocess.run(
-            ["transmission-remote",
-             "-N", self._transmission_auth_file, "-t", torrent_id, "-i"],
-            capture_output=True, check=False, text=True)
-        if result.returncode != 0:
-            return None
+        now = time.monotonic()
+        if (self._last_cleanup_ts is not None
+                and now - self._last_cleanup_ts < CLEANUP_PERIOD):
+            return
+        self._last_cleanup_ts = now
 
-        info_lines = result.stdout.splitlines()
-        if not info_lines:
-            return None
+        # The ID of a torrent might change (e.g. daemon restart), so the
+        # current ID is taken from the completed list reported by the daemon
+        for torrent_hash, torrent in self._database.items():
+            if torrent['copied'] is True:
+                finished_days = int(
+                    (time.time() - torrent['date_finished_ts']) // 86400)
+                if finished_days > 30:
+                    daemon_item = daemon_completed_map.get(torrent_hash)
+                    if daemon_item is None:
+                        continue
+                    self._logger.info("Removing: %s", torrent['name'])
+                    self._rpc('torrent-remove',
+                              {'ids': [daemon_item['id']],
+                               'delete-local-data': True})
+
+    def _rsync_torrents(self, torrents):
+        """Copy multiple torrents to the NAS with a single `rsync` invocation.
+
+        The names of the torrents are passed to `rsync` via `--files-from`, so
+        that all torrents are handled by one process and one scan of the
+        destination.
 
-        torrent_name = None
-        torrent_hash = None
-        torrent_done = None
-        date_finished = None
-
-        for info_line in info_lines:
-            info_line = info_line.strip()
-            if "Name:" in info_line:
-                torrent_name = info_line.lstrip("Name:").strip()
-            if "Hash:" in info_line:
-                torrent_hash = info_line.lstrip("Hash:").strip()
-            if "Percent Done:" in info_line:
-                torrent_done = info_line.lstrip("Percent Done:").strip()
-            if "Date finished:" in info_line:
-                date_finished = info_line.lstrip("Date finished:").strip()
-
-        results = (torrent_name, torrent_hash, torrent_done, date_finished)
-        return results if None not in results else None
-
-    def _get_torrent_completed_file_count(self, torrent_id):
-        """Get the file count of completed files from a torrent.
-
-        This function checks a torrent by its ID and returns the count of the
-        files that have already been completed.
-
-        :param torrent_id: The ID of the requested torrent.
-        :type torrent_id: integer
-        :return: The count of the completed files of the requested torrent.
-        :rtype: integer
+        :param torrents: The torrents to be copied.
+        :type torrents: list
+        :return: True if all torrents were successfully copied; otherwise
+                 False.
+        :rtype: bool
+        """
+        for torrent in torrents:
+            self._logger.info("Updating: %s", torrent['name'])
+        time_copy_begin = time.time()
+        result = self._rsync(
+            ["-r", "--files-from=-", "--from0",
+                self._local_dir + "/", self._nas_dir + "/"],
+            "\0".join(torrent['name'] for torrent in torrents))
+        if result.returncode != 0:
+            self._logger.error("Failed to rsync torrents; retrying one by "
+                               "one.")
+            self._logger.error(result.stderr)
+            return False
+
+        time_copy_end = time.time()
+        for torrent in torrents:
+            torrent['copied'] = True
+            self._logger.info("Updating done: %s, Size: %s %s",
+                              torrent['name'], torrent['have_size'],
+                              torrent['have_unit'])
+        elapsed_s = round(time_copy_end - time_copy_begin)
+        duration = str(datetime.timedelta(seconds=elapsed_s))
+        self._logger.info("Updating done. Count: %d, Duration: %s",
+                          len(torrents), duration)
+        return True
+
+    def _rsync(self, arguments, input_data=None):
+        """Execute `rsync` with the common options for copying torrents.
+
+        The list of transferred files and the transfer statistics are only
+        requested (and logged) if debug logging is enabled; otherwise the
+        standard output of `rsync` is discarded. Interrupted transfers are
+        kept in `RSYNC_PARTIAL_DIR` and resumed upon the next execution.
+
+        :param arguments: The arguments appended to the common options.
+        :type arguments: list
+        :param input_data: Data passed to the standard input of `rsync`,
+                           defaults to None.
+        :type input_data: string
+        :return: The result of the `rsync` execution.
+        :rtype: subprocess.CompletedProcess
         """
+        is_debug = self._logger.isEnabledFor(logging.DEBUG)
+        command = ["rsync", "-ahu", "--exclude=*.part",
+                   "--partial-dir=" + RSYNC_PARTIAL_DIR]
+        if is_debug:
+            command.append("--info=name,stats2")
         result = subprocess.run(
-            ["transmission-remote",
-             "-N", self._transmission_auth_file, "-t", torrent_id, "-if"],
-            capture_output=True, check=False, text=True)
+            command + arguments, input=input_data,
+            stdout=subprocess.PIPE if is_debug else subprocess.DEVNULL,
+            stderr=subprocess.PIPE, check=False, text=True)
+        if is_debug:
+            self._logger.debug(result.stdout)
+        return result
+
+    def _scan_local_dir(self):
+        """Scan the local directory where Transmission puts the downloads.
+
+        :return: Dictionary of the entries of the local directory; the keys
+                 are the entry names and the values are True for directories;
+                 empty dictionary if the local directory cannot be read.
+        :rtype: dict
+        """
+        try:
+            with os.scandir(self._local_dir) as entries:
+                return {entry.name: entry.is_dir() for entry in entries}
+        except OSError as error:
+            self._logger.error("Cannot read local directory: %s", error)
+            return {}
+
+    def _rsync_torrent(self, torrent, is_dir):
+        """Copy a single torrent to the NAS with `rsync`.
+
+        :param torrent: The torrent to be copied.
+        :type torrent: dict
+        :param is_dir: True if the local data of the torrent is a directory.
+        :type is_dir: bool
+        :return: True if the torrent was successfully copied; otherwise False.
+        :rtype: bool
+        """
+        self._logger.info("Updating: %s", torrent['name'])
+        torrent_path_local = os.path.join(self._local_dir, torrent['name'])
+        torrent_path_nas = os.path.join(self._nas_dir, torrent['name'])
+        time_copy_begin = time.time()
+        torrent_source = torrent_path_local + "/" if is_dir \
+            else torrent_path_local
+        result = self._rsync([torrent_source, torrent_path_nas])
         if result.returncode != 0:
-            return 0
-
-        completed_file_count = 0
-        info_lines = result.stdout.splitlines()
-        for info_line in info_lines[2:]:
-            info_line = info_line.strip()
-            if "100%" in info_line:
-                completed_file_count += 1
+            self._logger.error("Failed to rsync torrent: %s",
+                               torrent['name'])
+            self._logger.error(result.stderr)
+            return False
+
+        time_copy_end = time.time()
+        torrent['copied'] = True
+        elapsed_s = round(time_copy_end - time_copy_begin)
+        duration = str(datetime.timedelta(seconds=elapsed_s))
+        self._logger.info(
+            "Updating done. Size: %s %s, Duration: %s",
+            torrent['have_size'], torrent['have_unit'], duration)
+        return True
+
+    def _rpc(self, method, arguments=None):
+        """Execute a request on the RPC interface of the daemon.
+
+        The function handles the CSRF protection of the daemon: if the daemon
+        responds with HTTP 409, the session ID supplied in the response is
+        stored and the request is repeated. The credentials (if any) are the
+        ones read from the Transmission credentials file upon construction.
+
+        :param method: The name of the RPC method, e.g. `torrent-get`.
+        :type method: string
+        :param arguments: The arguments of the RPC method, defaults to None.
+        :type arguments: dict
+        :return: The arguments of the response if the request succeeded;
+                 otherwise `None`.
+        :rtype: dict
+        """
+        request_body = json.dumps(
+            {'method': method, 'arguments': arguments or {}}).encode()
+
+        for _ in range(2):
+            headers = {'Content-Type': 'application/json'}
+            if self._rpc_session_id is not None:
+                headers['X-Transmission-Session-Id'] = self._rpc_session_id
+            if self._rpc_auth:
+                headers['Authorization'] = "Basic " + self._rpc_auth
+            request = urllib.request.Request(
+                self._transmission_url, data=request_body, headers=headers)
+            try:
+                with urllib.request.urlopen(
+                        request, timeout=RPC_TIMEOUT) as response:
+                    reply = json.load(response)
+            except urllib.error.HTTPError as error:
+                if error.code == 409:
+                    self._rpc_session_id = error.headers.get(
+                        'X-Transmission-Session-Id')
+                    continue
+                self._logger.error("RPC request '%s' failed: %s",
+                                   method, error)
+                return None
+            except (OSError, ValueError, http.client.HTTPException) as error:
+                self._logger.error("RPC request '%s' failed: %s",
+                                   method, error)
+                return None
+
+            if reply.get('result') != 'success':
+                self._logger.error("RPC request '%s' failed: %s",
+                                   method, reply.get('result'))
+                return None
+            return reply.get('arguments', {})
 
-        return completed_file_count
+        return None
 
-    def _get_completed_torrents(self):
-        """Get an array of completed torrents from the daemon.
+    def _read_transmission_auth(self):
+        """Read the Transmission credentials from the credentials file.
 
-        This function compiles a list containing completed torrents and their
-        respective information. Each completed torrent is represented by a set
-        containing the torrent name, hash, date finsihed, size, unit of size,
-        file count.
+        The credentials file is either in netrc format (the same file that can
+        be supplied to `transmission-remote` via its `-N` option), in which
+        case the entry that matches the host of the RPC URL is used; or it
+        contains a single `user:password` line (the same format that can be
+        supplied to `transmission-remote` via its `-n` option).
 
-        :return: List of completed torrents; each completed torrent is
-                 represented by a set containing torrent name, hash, date
-                 finsihed, size, unit of size, file count.
-        :rtype: list
+        :return: The base64-encoded `user:password` string for HTTP Basic
+                 authentication; empty string if no credentials are found.
+        :rtype: string
         """
-        result = subprocess.run(
-            ["transmission-remote", "-N", self._transmission_auth_file, "-l"],
-            capture_output=True, check=False, text=True)
-        if result.returncode != 0:
-            self._logger.error(result.stderr)
-            return None
+        host = urllib.parse.urlsplit(self._transmission_url).hostname
+        try:
+            authenticators = netrc.netrc(
+                self._transmission_auth_file).authenticators(host)
+        except OSError as error:
+            self._logger.error("Cannot read Transmission credentials: %s",
+                               error)
+            return ""
+        except netrc.NetrcParseError as error:
+            # Not a netrc file; try the `user:password` format
+            with open(self._transmission_auth_file,
+                      encoding='utf-8') as auth_file:
+                credentials = auth_file.read().strip()
+            if ":" not in credentials or "\n" in credentials:
+                self._logger.error("Cannot read Transmission credentials: %s",
+                                   error)
+                return ""
+            return base64.b64encode(credentials.encode()).decode()
+        if authenticators is None:
+            self._logger.warning("No Transmission credentials found for host "
+                                 "'%s' in %s.", host,
+                                 self._transmission_auth_file)
+            return ""
+
+        (login, _, password) = authenticators
+        credentials = "{}:{}".format(login, password or "")
+        return base64.b64encode(credentials.encode()).decode()
 
-        completed_torrent_list = []
-
-        torrent_list_lines = result.stdout.splitlines()
-        for torrent_line in torrent_list_lines[1:-1]:
-            torrent_id = torrent_line.split()[0]
-            torrent_have_size = torrent_line.split()[2]
-            torrent_have_unit = torrent_line.split()[3]
-            torrent_info = self._get_torrent_info(torrent_id)
-            if torrent_info is not None:
-                (torrent_name, torrent_hash, torrent_done, date_finished) = \
-                    torrent_info
-                torrent_have_files = self._get_torrent_completed_file_count(
-                    torrent_id)
-                if (torrent_done is not None) and ("100%" in torrent_done):
-                    completed_torrent_item = {
-                        'name': torrent_name,
-                        'hash': torrent_hash,
-                        'date_finished': date_finished,
-                        'have_size': torrent_have_size,
-                        'have_unit': torrent_have_unit,
-                        'have_files': torrent_have_files,
-                        'copied': False
-                    }
-                    completed_torrent_list.append(completed_torrent_item)
-
-        return completed_torrent_list
-
-    def _get_torrent_id_based_on_hash(self, torrent_hash):
-        """Get the ID of a torrent based on its hash from the daemon.
-
-        This function is used for looking up a torrent based on its hash from
-        the daemon. The ID of a torrent might change, but its hash always
-        identifies it uniquely.
-
-        :param torrent_hash: The hash of a torrent to be looked up.
-        :type torrent_hash: string
-        :return: The ID of the torrent based on its hash if exists; otherwise
-                 `None`.
-        :rtype: integer
+    def _get_completed_torrents(self):
+        """Get the completed torrents from the daemon.
+
+        This function compiles a dictionary containing completed torrents and
+        their respective information with a single `torrent-get` RPC request.
+        Each completed torrent is represented by a set containing the torrent
+        ID, name, hash, date finsihed (as a POSIX timestamp), size, unit of
+        size, file count.
+
+        :return: Dictionary of completed torrents keyed by the torrent hash;
+                 each completed torrent is represented by a set containing
+                 torrent ID, name, hash, date finsihed, size, unit of size,
+                 file count.
+        :rtype: dict
         """
-        result = subprocess.run(
-            ["transmission-remote", "-N", self._transmission_auth_file, "-l"],
-            capture_output=True, check=False, text=True)
-        if result.returncode != 0:
+        result = self._rpc('torrent-get', {'fields': RPC_TORRENT_FIELDS})
+        if result is None:
             return None
 
-        torrent_list_lines = result.stdout.splitlines()
-        for torrent_line in torrent_list_lines[1:-1]:
-            torrent_id = torrent_line.split()[0]
-            torrent_info = self._get_torrent_info(torrent_id)
-            if torrent_info is not None:
-                (_, current_hash, _, _) = torrent_info
-                if current_hash == torrent_hash:
-                    return torrent_id
-
-        return None
+        completed_torrents = {}
+
+        for torrent in result.get('torrents', []):
+            # Torrents without a finished date are ignored, just like the
+            # torrents that are not completed yet
+            if torrent['percentDone'] < 1.0 or not torrent['doneDate']:
+                continue
+            (torrent_have_size, torrent_have_unit) = _format_size(
+                torrent['haveValid'])
+            torrent_have_files = sum(
+                1 for torrent_file in torrent['files']
+                if torrent_file['bytesCompleted'] == torrent_file['length'])
+            completed_torrent_item = {
+                'id': torrent['id'],
+                'name': torrent['name'],
+                'hash': torrent['hashString'],
+                'date_finished_ts': torrent['doneDate'],
+                'have_size': torrent_have_size,
+                'have_unit': torrent_have_unit,
+                'have_files': torrent_have_files,
+                'copied': False
+            }
+            completed_torrents[torrent['hashString']] = completed_torrent_item
+
+        return completed_torrents
 
     def _mount_nas(self):
         """Mount the SMB share of the NAS.
 
         This function checks whether the NAS SMB share had been already mounted
-        and it only executes the mounting command if needed.
+        (with a single `statfs` via `os.path.ismount`) and it only executes the
+        mounting command if needed.
 
         :return: List of bools. The first bool is True if the share is
                  successfully mounted after executing this function (either it
@@ -358,10 +567,7 @@ class TransmissionWatcher:
         is_mounted = True
         is_mount_executed = False
 
-        result = subprocess.run(
-            ["mount", "-t", "cifs"],
-            capture_output=True, check=False, text=True)
-        if self._nas_dir not in result.stdout:
+        if not os.path.ismount(self._nas_dir):
             result = subprocess.run(
                 ["mount", self._nas_dir],
                 capture_output=True, check=False, text=True)
@@ -382,10 +588,7 @@ class TransmissionWatcher:
         :return: True if the NAS was successfully unmounted; otherwise False.
         :rtype: bool
         """
-        result = subprocess.run(
-            ["mount", "-t", "cifs"],
-            capture_output=True, check=False, text=True)
-        if self._nas_dir in result.stdout:
+        if os.path.ismount(self._nas_dir):
             result = subprocess.run(
                 ["umount", self._nas_dir],
                 capture_output=True, check=False, text=True)